@@ -3,9 +3,15 @@ from __future__ import annotations
 
 import argparse
 import csv
+import io
 import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import groupby
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, TextIO
 
 import duckdb
 
@@ -20,32 +26,60 @@ def _jsonable_scalar(x: Any) -> Any:
     return str(x)
 
 
+# Checked in priority order (BOOL before INT before FLOAT), so e.g. a STRUCT with both
+# INTEGER and DOUBLE members still maps to NUMBER.
+_SIMPLE_TYPE_RULES: tuple[tuple[re.Pattern[str], str], ...] = (
+    (re.compile("BOOL"), "BOOLEAN"),
+    (re.compile("INT|DECIMAL|NUMERIC"), "NUMBER"),
+    (re.compile("DOUBLE|REAL|FLOAT"), "FLOAT"),
+)
+
+# DuckDB's scalar type names are a small closed set; resolve those with a dict lookup
+# and only fall back to the regex rules for parameterized/nested types (DECIMAL(18,3), ...).
+_EXACT_SIMPLE_TYPES = {
+    "BOOLEAN": "BOOLEAN",
+    "TINYINT": "NUMBER",
+    "SMALLINT": "NUMBER",
+    "INTEGER": "NUMBER",
+    "BIGINT": "NUMBER",
+    "HUGEINT": "NUMBER",
+    "UTINYINT": "NUMBER",
+    "USMALLINT": "NUMBER",
+    "UINTEGER": "NUMBER",
+    "UBIGINT": "NUMBER",
+    "UHUGEINT": "NUMBER",
+    "FLOAT": "FLOAT",
+    "REAL": "FLOAT",
+    "DOUBLE": "FLOAT",
+    "VARCHAR": "TEXT",
+    "BLOB": "TEXT",
+    "DATE": "TEXT",
+    "TIME": "TEXT",
+    "TIMESTAMP": "TEXT",
+    "TIMESTAMP WITH TIME ZONE": "TEXT",
+    "UUID": "TEXT",
+}
+
+
+# DuckDB types whose Python values are already JSON-native (None/bool/int/float/str).
+_JSON_NATIVE_TYPES = frozenset(
+    t for t, simple in _EXACT_SIMPLE_TYPES.items() if simple != "TEXT"
+) | {"VARCHAR"}
+
+
+@lru_cache(maxsize=512)
 def _simple_type(duck_type: str) -> str:
     t = (duck_type or "").upper()
-    if "BOOL" in t:
-        return "BOOLEAN"
-    if any(
-        k in t
-        for k in (
-            "INT",
-            "HUGEINT",
-            "UBIGINT",
-            "UINTEGER",
-            "USMALLINT",
-            "UTINYINT",
-            "SMALLINT",
-            "TINYINT",
-            "BIGINT",
-        )
-    ):
-        return "NUMBER"
-    if "DECIMAL" in t or "NUMERIC" in t:
-        return "NUMBER"
-    if any(k in t for k in ("DOUBLE", "REAL", "FLOAT")):
-        return "FLOAT"
+    simple = _EXACT_SIMPLE_TYPES.get(t)
+    if simple is not None:
+        return simple
+    for pattern, simple in _SIMPLE_TYPE_RULES:
+        if pattern.search(t):
+            return simple
     return "TEXT"
 
 
+@lru_cache(maxsize=512)
 def _ddl_type(simple: str) -> str:
     if simple == "BOOLEAN":
         return "BOOLEAN"
@@ -60,57 +94,141 @@ def _quote_ident(name: str) -> str:
     return '"' + name.replace('"', '""') + '"'
 
 
-def export_one(db_id: str, duckdb_path: Path, out_root: Path, *, sample_rows: int) -> None:
+_encode_json = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _json_list(items: Iterable[Any]) -> str:
+    # Same text as json.dumps(items, indent=4) for a list of scalars one level deep.
+    body = ",".join("\n        " + _encode_json(x) for x in items)
+    return "[" + body + "\n    ]" if body else "[]"
+
+
+def _write_sample_rows(f: TextIO, col_names: list[str], rows: Iterable[tuple[Any, ...]]) -> None:
+    # Hand-rolled equivalent of json.dump(indent=4) for the "sample_rows" array at this
+    # nesting depth: keys are encoded once per table and no per-row dict is built.
+    key_prefixes = ["\n            " + _encode_json(cn) + ": " for cn in col_names]
+    f.write("[")
+    sep = ""
+    for row in rows:
+        f.write(sep + "\n        {")
+        f.write(",".join(kp + _encode_json(v) for kp, v in zip(key_prefixes, row)))
+        f.write("\n        }")
+        sep = ","
+    f.write("\n    ]" if sep else "]")
+
+
+def _connect() -> duckdb.DuckDBPyConnection:
+    # Metadata + a handful of sample rows per table: a single thread and a small buffer
+    # pool keep the setup cost low (and leave cores to the other export workers).
+    return duckdb.connect(":memory:", config={"threads": "1", "memory_limit": "256MB"})
+
+
+# One in-memory connection per worker process; each DuckDB file is ATTACHed to it in turn.
+_worker_con: duckdb.DuckDBPyConnection | None = None
+
+
+def export_one(
+    db_id: str,
+    duckdb_path: Path,
+    out_root: Path,
+    *,
+    sample_rows: int,
+    con: duckdb.DuckDBPyConnection | None = None,
+) -> None:
     out_dir = out_root / db_id / db_id
     out_dir.mkdir(parents=True, exist_ok=True)
+    # Plain string prefix for the per-table files; avoids a Path join per table.
+    out_prefix = str(out_dir) + os.sep
 
-    con = duckdb.connect(str(duckdb_path), read_only=True)
+    own_con = con is None
+    if con is None:
+        con = _connect()
+    path_lit = str(duckdb_path).replace("'", "''")
+    con.execute(f"ATTACH '{path_lit}' AS export_src (READ_ONLY)")
     try:
-        tables = [r[0] for r in con.execute("SHOW TABLES").fetchall()]
+        con.execute("USE export_src")
+        # One metadata query for all tables instead of SHOW TABLES + DESCRIBE per table.
+        # duckdb_columns() is the catalog function information_schema.columns is built on.
+        col_rows = con.execute(
+            "SELECT table_name, column_name, data_type FROM duckdb_columns() "
+            "WHERE database_name = current_database() AND schema_name = current_schema() "
+            "ORDER BY table_name, column_index"
+        ).fetchall()
+
+        tables: list[tuple[str, list[str], list[str]]] = []
+        for table, cols in groupby(col_rows, key=lambda r: r[0]):
+            cols = list(cols)
+            tables.append((str(table), [str(r[1]) for r in cols], [str(r[2]) for r in cols]))
+
+        # Pull every table's sample in a single round-trip: one output column per table,
+        # each a LIST of row STRUCTs (NULL for an empty table). The connection is
+        # single-threaded, so list() keeps the LIMIT scan's row order.
+        packed_samples: tuple[Any, ...] = ()
+        if sample_rows > 0 and tables:
+            limit = int(sample_rows)
+            select_list = ", ".join(
+                f"(SELECT list(t) FROM (SELECT * FROM {_quote_ident(table)} LIMIT {limit}) t)"
+                for table, _, _ in tables
+            )
+            packed_samples = con.execute(f"SELECT {select_list}").fetchone()
 
         ddl_rows: list[tuple[str, str, str]] = []
-        for table in tables:
-            desc_rows = con.execute(f"DESCRIBE {_quote_ident(table)}").fetchall()
-            col_names = [str(r[0]) for r in desc_rows]
-            duck_types = [str(r[1]) for r in desc_rows]
+        for i, (table, col_names, duck_types) in enumerate(tables):
             simple_types = [_simple_type(t) for t in duck_types]
 
             # DDL.csv row
-            ddl_lines = [f"create or replace TABLE {table} ("]
-            for i, (cn, st) in enumerate(zip(col_names, simple_types)):
-                comma = "," if i < len(col_names) - 1 else ""
-                ddl_lines.append(f'\t{_quote_ident(cn)} {_ddl_type(st)}{comma}')
-            ddl_lines.append(");")
-            ddl = "\n".join(ddl_lines)
+            body = ",\n".join(f"\t{_quote_ident(cn)} {_ddl_type(st)}" for cn, st in zip(col_names, simple_types))
+            ddl = f"create or replace TABLE {table} (\n{body}\n);"
             ddl_rows.append((table, "", ddl))
 
             # Per-table JSON schema
-            sample: list[dict[str, Any]] = []
-            if sample_rows > 0:
-                rows = con.execute(f"SELECT * FROM {_quote_ident(table)} LIMIT {int(sample_rows)}").fetchall()
-                for row in rows:
-                    sample.append({cn: _jsonable_scalar(v) for cn, v in zip(col_names, row)})
-
-            obj = {
-                "table_name": f"{db_id}.{table}",
-                "table_fullname": f"{db_id}.{db_id}.{table}",
-                "column_names": col_names,
-                "column_types": simple_types,
-                "description": [None for _ in col_names],
-                "sample_rows": sample,
-            }
-            (out_dir / f"{table}.json").write_text(
-                json.dumps(obj, ensure_ascii=False, indent=4) + "\n", encoding="utf-8"
+            sample: Iterable[tuple[Any, ...]] = ()
+            if packed_samples:
+                rows = [tuple(r.values()) for r in packed_samples[i] or ()]
+                # Convert column-at-a-time, and only the columns whose type needs it
+                # (DECIMAL, TIMESTAMP, BLOB, ...); native columns pass through untouched.
+                columns = [
+                    col if dt in _JSON_NATIVE_TYPES else list(map(_jsonable_scalar, col))
+                    for col, dt in zip(zip(*rows), duck_types)
+                ]
+                sample = zip(*columns)
+
+            # The per-table JSON is laid out exactly as json.dump(indent=4) would, but
+            # built from C-encoded scalars: the stdlib's indent mode is pure Python.
+            fields = (
+                ("table_name", _encode_json(f"{db_id}.{table}")),
+                ("table_fullname", _encode_json(f"{db_id}.{db_id}.{table}")),
+                ("column_names", _json_list(col_names)),
+                ("column_types", _json_list(simple_types)),
+                ("description", _json_list([None] * len(col_names))),
             )
+            with open(out_prefix + table + ".json", "w", encoding="utf-8") as f:
+                f.write("{" + ",".join(f'\n    "{k}": {v}' for k, v in fields))
+                f.write(',\n    "sample_rows": ')
+                _write_sample_rows(f, col_names, sample)
+                f.write("\n}\n")
 
-        # Write DDL.csv
+        # Write DDL.csv (staged in memory, flushed with a single write)
+        buf = io.StringIO(newline="")
+        w = csv.writer(buf)
+        w.writerow(["table_name", "description", "DDL"])
+        w.writerows(ddl_rows)
         with (out_dir / "DDL.csv").open("w", encoding="utf-8", newline="") as f:
-            w = csv.writer(f)
-            w.writerow(["table_name", "description", "DDL"])
-            for row in ddl_rows:
-                w.writerow(row)
+            f.write(buf.getvalue())
     finally:
-        con.close()
+        con.execute("USE memory")
+        con.execute("DETACH export_src")
+        if own_con:
+            con.close()
+
+
+def _export_worker(job: tuple[str, Path, Path, int]) -> str:
+    global _worker_con
+    if _worker_con is None:
+        _worker_con = _connect()
+    db_id, duckdb_path, out_root, sample_rows = job
+    export_one(db_id, duckdb_path, out_root, sample_rows=sample_rows, con=_worker_con)
+    return db_id
 
 
 def main() -> int:
@@ -133,6 +251,12 @@ def main() -> int:
         default=5,
         help="Number of sample rows to include per table (default: 5).",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of worker processes; each DuckDB file is exported independently (default: one per CPU).",
+    )
     args = parser.parse_args()
 
     db_eval_dir = Path(args.db_eval_dir).resolve()
@@ -142,10 +266,11 @@ def main() -> int:
     if not duckdb_files:
         raise SystemExit(f"No .duckdb files found in: {db_eval_dir}")
 
-    for p in duckdb_files:
-        db_id = p.stem
-        export_one(db_id, p, out_root, sample_rows=int(args.sample_rows))
-        print(f"[ok] {db_id} -> {out_root / db_id / db_id}")
+    jobs = [(p.stem, p, out_root, int(args.sample_rows)) for p in duckdb_files]
+    max_workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(jobs))
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        for db_id in ex.map(_export_worker, jobs):
+            print(f"[ok] {db_id} -> {out_root / db_id / db_id}")
 
     return 0
 
@@ -15,8 +15,10 @@ import subprocess
 import sys
 import time
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from decimal import Decimal
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Iterable
 
@@ -35,13 +37,34 @@ duckdb = _require_import("duckdb")
 sqlglot = _require_import("sqlglot")
 sqlite2duckdb = _require_import("sqlite2duckdb")
 
+try:
+    import orjson  # optional: faster JSON decoding; stdlib json is the fallback
+except ImportError:
+    orjson = None
+
+
+def _loads_json(data: bytes | str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN/Infinity or huge ints, which stdlib json accepts but orjson rejects.
+            pass
+    return json.loads(data)
+
 
 def _is_sqlite_file(p: Path) -> bool:
+    # Raw fd read: no buffered file object for a 16-byte header peek.
     try:
-        with p.open("rb") as f:
-            return f.read(16) == b"SQLite format 3\x00"
-    except Exception:
+        fd = os.open(p, os.O_RDONLY)
+    except OSError:
         return False
+    try:
+        return os.read(fd, 16) == b"SQLite format 3\x00"
+    except OSError:
+        return False
+    finally:
+        os.close(fd)
 
 
 def _iter_csv_rows(csv_path: Path) -> Iterable[list[str]]:
@@ -52,6 +75,13 @@ def _iter_csv_rows(csv_path: Path) -> Iterable[list[str]]:
                 yield row
 
 
+@lru_cache(maxsize=None)
+def _read_csv_rows(csv_path: Path) -> list[list[str]]:
+    # The query CSVs are small but get scanned by the hybrid-overlap filter and by every
+    # evaluation pass; parse each file once. Callers must not mutate the result.
+    return list(_iter_csv_rows(csv_path))
+
+
 def _safe_unlink(path: Path) -> None:
     try:
         path.unlink()
@@ -59,6 +89,48 @@ def _safe_unlink(path: Path) -> None:
         return
 
 
+_FICLONE = 0x40049409  # Linux ioctl: share the source's extents (reflink)
+
+
+def _clone_file(src: str | os.PathLike[str], dst: str | os.PathLike[str]) -> None:
+    # Like shutil.copy2, but try a copy-on-write clone first (near-free on Btrfs/XFS),
+    # then an in-kernel copy_file_range; anything unsupported falls back to copy2.
+    try:
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except OSError:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if n == 0:
+                        raise OSError("copy_file_range stopped early")
+                    remaining -= n
+        shutil.copystat(src, dst)
+    except (ImportError, AttributeError, OSError):
+        shutil.copy2(src, dst)
+
+
+def _connect_sqlite_ro(sqlite_db: Path) -> sqlite3.Connection:
+    # Gold SQL only reads: open read-only, refuse writes, and give repeated scans of the
+    # same DB a large page cache plus mmap'd IO.
+    conn = sqlite3.connect(sqlite_db.resolve().as_uri() + "?mode=ro", uri=True)
+    conn.execute("PRAGMA query_only=1")
+    conn.execute("PRAGMA cache_size=-200000")
+    conn.execute("PRAGMA mmap_size=30000000000")
+    return conn
+
+
+def _connect_duck_ro(duck_db: Path) -> duckdb.DuckDBPyConnection:
+    # Evaluation connections: pin DuckDB's parallel scans to every core explicitly (the
+    # default can be lower inside containers/child processes) and skip progress-bar work.
+    conn = duckdb.connect(str(duck_db), read_only=True, config={"threads": str(os.cpu_count() or 1)})
+    conn.execute("SET enable_progress_bar = false")
+    return conn
+
+
 def _convert_sqlite_to_duckdb_with_all_varchar(sqlite_db: Path, duck_db: Path) -> None:
     conn = duckdb.connect(str(duck_db))
     try:
@@ -87,10 +159,15 @@ def _convert_sqlite_to_duckdb_with_all_varchar(sqlite_db: Path, duck_db: Path) -
         tables = [i[0] for i in conn.sql("SHOW tables").fetchall()]
         conn.sql(f"USE {db_name};")
 
+        # Submit all copies as one script in a single transaction instead of 2N round-trips.
+        # (COPY FROM DATABASE would also carry over the SQLite NOT NULL/PRIMARY KEY
+        # constraints, which the CTAS copies deliberately don't.)
+        script = ["BEGIN TRANSACTION;"]
         for table in tables:
             t = '"' + str(table).replace('"', '""') + '"'
-            conn.sql(f"DROP TABLE IF EXISTS {t};")
-            conn.sql(f"CREATE TABLE {t} AS SELECT * FROM __other.{t};")
+            script.append(f"CREATE OR REPLACE TABLE {t} AS SELECT * FROM __other.{t};")
+        script.append("COMMIT;")
+        conn.execute("\n".join(script))
         conn.sql("DETACH __other;")
     finally:
         conn.close()
@@ -203,12 +280,20 @@ def apply_db_fixes(db_id: str, duck_db: Path) -> None:
         conn.close()
 
 
+# Gold SQLs repeat across *Queries.csv / *_HybridQueries.csv and across evaluation
+# passes; parse each distinct string once.
+@lru_cache(maxsize=8192)
 def transpile_sql(sqlite_sql: str) -> str:
     out = sqlglot.transpile(sqlite_sql, read="sqlite", write="duckdb", pretty=False)
     return out[0] if out else sqlite_sql
 
 
 _RE_STRFTIME_YEAR = re.compile(r"STRFTIME\(([^)]*?),\s*'%Y'\)")
+_RE_BIRTHDAY_DIFF = re.compile(
+    r"(CURRENT_TIMESTAMP)\s*-\s*([A-Za-z_][A-Za-z0-9_]*\.)?birthday\b", flags=re.IGNORECASE
+)
+_RE_T1_PLAYER_NAME = re.compile(r"\bSELECT\s+(t1\.)player_name\b", flags=re.IGNORECASE)
+_RE_TEAMINFO_LONG_NAME = re.compile(r"\bSELECT\s+(teamInfo\.)team_long_name\b", flags=re.IGNORECASE)
 
 
 def _filter_query_csvs(csv_paths: list[Path]) -> list[Path]:
@@ -229,7 +314,7 @@ def _filter_query_csvs(csv_paths: list[Path]) -> list[Path]:
 
         def gold_rows(path: Path) -> list[tuple[str, str]]:
             rows: list[tuple[str, str]] = []
-            for row in _iter_csv_rows(path):
+            for row in _read_csv_rows(path):
                 db_id = row[0].strip() if len(row) > 0 else ""
                 gold_sql = row[3] if len(row) > 3 else ""
                 rows.append((db_id, gold_sql))
@@ -245,9 +330,14 @@ def _dq(ident: str) -> str:
     return '"' + ident.replace('"', '""') + '"'
 
 
+# Exact types that pass through _jsonable_scalar unchanged; one set lookup settles
+# nearly every cell of a result set.
+_JSON_NATIVE_TYPES = frozenset({type(None), bool, int, float, str})
+
+
 def _jsonable_scalar(x: Any) -> Any:
-    if x is None:
-        return None
+    if type(x) in _JSON_NATIVE_TYPES:
+        return x
     if isinstance(x, (bool, int, float, str)):
         return x
     if isinstance(x, Decimal):
@@ -277,10 +367,24 @@ def _stable_key(x: Any) -> str:
     return json.dumps(x, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
 
 
-def _rows_as_counter(rows: list[tuple[Any, ...]]) -> Counter[str]:
-    return Counter(_stable_key([_jsonable_scalar(v) for v in row]) for row in rows)
+def _freeze(x: Any) -> tuple[Any, ...]:
+    # Hashable key with the same equality as _stable_key(x), without JSON-encoding:
+    # the type tag keeps 1, 1.0 and True apart, and floats compare by repr like JSON does.
+    if isinstance(x, float):
+        return (float, repr(x))
+    if isinstance(x, (dict, list)):
+        return (type(x), _stable_key(x))
+    return (type(x), x)
 
 
+def _rows_as_counter(rows: list[tuple[Any, ...]]) -> Counter[tuple[Any, ...]]:
+    return Counter(
+        tuple(_freeze(v if type(v) in _JSON_NATIVE_TYPES else _jsonable_scalar(v)) for v in row)
+        for row in rows
+    )
+
+
+@lru_cache(maxsize=8192)
 def rewrite_for_duckdb(sql: str) -> str:
     # Keep rewrites minimal and conservative. These cover remaining exec errors we observed.
     sql = sql.replace("DATETIME()", "CURRENT_TIMESTAMP")
@@ -290,29 +394,21 @@ def rewrite_for_duckdb(sql: str) -> str:
     if "STRFTIME" in sql and "%Y" in sql and "-" in sql:
         sql = _RE_STRFTIME_YEAR.sub(r"CAST(STRFTIME(\1, '%Y') AS INTEGER)", sql)
 
+    # The remaining patterns are case-insensitive and each needs a fixed keyword; skip
+    # the regex scan outright when it is absent.
+    lowered = sql.lower()
+
     # If query subtracts current_timestamp - some .birthday (stored as VARCHAR),
     # cast birthday to TIMESTAMP.
-    sql = re.sub(
-        r"(CURRENT_TIMESTAMP)\s*-\s*([A-Za-z_][A-Za-z0-9_]*\.)?birthday\b",
-        r"\\1 - CAST(\\2birthday AS TIMESTAMP)",
-        sql,
-        flags=re.IGNORECASE,
-    )
+    if "birthday" in lowered:
+        sql = _RE_BIRTHDAY_DIFF.sub(r"\\1 - CAST(\\2birthday AS TIMESTAMP)", sql)
 
     # DuckDB is strict about GROUP BY. For two known patterns, wrap the projected
     # non-grouped column with ANY_VALUE to match SQLite's loose grouping behavior.
-    sql = re.sub(
-        r"\bSELECT\s+(t1\.)player_name\b",
-        r"SELECT ANY_VALUE(\\1player_name) AS player_name",
-        sql,
-        flags=re.IGNORECASE,
-    )
-    sql = re.sub(
-        r"\bSELECT\s+(teamInfo\.)team_long_name\b",
-        r"SELECT ANY_VALUE(\\1team_long_name) AS team_long_name",
-        sql,
-        flags=re.IGNORECASE,
-    )
+    if "player_name" in lowered:
+        sql = _RE_T1_PLAYER_NAME.sub(r"SELECT ANY_VALUE(\\1player_name) AS player_name", sql)
+    if "team_long_name" in lowered:
+        sql = _RE_TEAMINFO_LONG_NAME.sub(r"SELECT ANY_VALUE(\\1team_long_name) AS team_long_name", sql)
 
     return sql
 
@@ -355,6 +451,19 @@ def scalar_equal(a: Any, b: Any) -> bool:
     return a == b
 
 
+def _row_equal(erow: tuple[Any, ...], grow: tuple[Any, ...]) -> bool:
+    # Plain tuple equality runs in C and decides the common case (identical values);
+    # only rows that differ there need the tolerant per-scalar comparison.
+    if erow == grow:
+        return True
+    if len(erow) != len(grow):
+        return False
+    for ea, ga in zip(erow, grow):
+        if not scalar_equal(ea, ga):
+            return False
+    return True
+
+
 def rows_equal(expected: Any, got: list[tuple[Any, ...]]) -> bool:
     if not isinstance(expected, list):
         return False
@@ -363,17 +472,25 @@ def rows_equal(expected: Any, got: list[tuple[Any, ...]]) -> bool:
     for erow, grow in zip(expected, got):
         if not isinstance(erow, list):
             return False
-        if len(erow) != len(grow):
+        if not _row_equal(tuple(erow), grow):
             return False
-        for ea, ga in zip(erow, list(grow)):
-            if not scalar_equal(ea, ga):
-                return False
     return True
 
 
+def _shapes_differ(a: list[Any], b: list[tuple[Any, ...]]) -> bool:
+    # Row count, then the width of the first row: a result set is rectangular, so a
+    # width mismatch there means no row of `a` can match any row of `b`.
+    if len(a) != len(b):
+        return True
+    return bool(a) and (not isinstance(a[0], (list, tuple)) or len(a[0]) != len(b[0]))
+
+
 def rows_equal_unordered(expected: Any, got: list[tuple[Any, ...]]) -> bool:
     if not isinstance(expected, list):
         return False
+    # Settle cheap shape mismatches before building and hashing both multisets.
+    if _shapes_differ(expected, got):
+        return False
     exp_rows: list[tuple[Any, ...]] = []
     for r in expected:
         if not isinstance(r, list):
@@ -391,38 +508,32 @@ def rows_equal_sqlite_duckdb(
     if not unordered:
         if len(sqlite_rows) != len(duck_rows):
             return False
+        if sqlite_rows == duck_rows:
+            return True
         for sr, dr in zip(sqlite_rows, duck_rows):
-            if len(sr) != len(dr):
+            if not _row_equal(sr, dr):
                 return False
-            for a, b in zip(sr, dr):
-                if not scalar_equal(a, b):
-                    return False
         return True
+    if _shapes_differ(sqlite_rows, duck_rows):
+        return False
     return _rows_as_counter(sqlite_rows) == _rows_as_counter(duck_rows)
 
 
-PAIR_RE = re.compile(
-    r"""
-    (?:
-        (?P<table_bt>[A-Za-z0-9_]+)\.\`(?P<col_bt>[^`]+)\`
-      |
-        (?P<table>[A-Za-z0-9_]+)\.(?P<col>[A-Za-z0-9_]+)
-    )
-    """,
-    re.VERBOSE,
-)
+# Backticked "table.`col with spaces`" or plain "table.col". Numbered groups so findall
+# hands back plain tuples (no per-match Match objects or group-name lookups).
+PAIR_RE = re.compile(r"([A-Za-z0-9_]+)\.`([^`]+)`|([A-Za-z0-9_]+)\.([A-Za-z0-9_]+)")
 
 
 def _iter_pairs(expr: str) -> Iterable[tuple[str, str]]:
-    matches = list(PAIR_RE.finditer(expr))
-    if not matches:
+    pairs = PAIR_RE.findall(expr)
+    if not pairs:
         if "." in expr:
             table, col = expr.split(".", 1)
             yield table.strip(), col.strip().strip("`")
         return
-    for m in matches:
-        table = (m.group("table_bt") or m.group("table") or "").strip()
-        col = (m.group("col_bt") or m.group("col") or "").strip()
+    for table_bt, col_bt, table, col in pairs:
+        table = (table_bt or table).strip()
+        col = (col_bt or col).strip()
         if table and col:
             yield table, col
 
@@ -462,17 +573,21 @@ def nullify_columns_in_duckdb(
     verbose: bool,
 ) -> int:
     dst_duckdb.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(src_duckdb, dst_duckdb)
+    _clone_file(src_duckdb, dst_duckdb)
 
     conn = duckdb.connect(str(dst_duckdb))
     try:
         table_map = _duck_list_tables(conn)
         table_aliases = {"fprm": "frpm"}  # observed typo in columns_to_drop.pickle
+        # Only UPDATEs run below, so each table's PRAGMA table_info result stays valid.
+        table_info_cache: dict[str, dict[str, tuple[str, str, bool, bool]]] = {}
 
         applied = 0
         failed = 0
         missing = 0
 
+        # Pass 1: resolve every reference, grouping the target columns per table.
+        per_table: dict[str, list[tuple[str, str, str]]] = {}
         for ref in columns:
             for table_raw, col_raw in _iter_pairs(ref):
                 t = table_raw.strip().strip('"').strip("`")
@@ -484,7 +599,9 @@ def nullify_columns_in_duckdb(
                         print(f"[missing-table] {db_id}: {table_raw} (from {ref!r})", file=sys.stderr)
                     continue
 
-                col_map = _duck_table_info(conn, table)
+                col_map = table_info_cache.get(table)
+                if col_map is None:
+                    col_map = table_info_cache[table] = _duck_table_info(conn, table)
                 ci = col_map.get(col_raw.lower())
                 if not ci:
                     missing += 1
@@ -496,6 +613,37 @@ def nullify_columns_in_duckdb(
                     continue
 
                 col_name, col_type, _notnull, _pk = ci
+                per_table.setdefault(table, []).append((col_name, col_type, ref))
+
+        # Pass 2: one multi-column UPDATE per table (DuckDB rewrites the table on every
+        # UPDATE), all submitted as a single script in one transaction.
+        updates = {
+            table: f"UPDATE {_dq(table)} SET "
+            + ", ".join(f"{_dq(c)} = NULL" for c in dict.fromkeys(c for c, _, _ in targets))
+            for table, targets in per_table.items()
+        }
+        if updates:
+            try:
+                conn.execute("BEGIN TRANSACTION;\n" + ";\n".join(updates.values()) + ";\nCOMMIT;")
+                applied += sum(len(targets) for targets in per_table.values())
+                per_table = {}
+            except Exception:
+                try:
+                    conn.execute("ROLLBACK")
+                except Exception:
+                    pass
+
+        # If the batch failed, e.g. on a NOT NULL column, redo it table by table and, for
+        # a failing table, column by column.
+        for table, targets in per_table.items():
+            try:
+                conn.execute(updates[table])
+                applied += len(targets)
+                continue
+            except Exception:
+                pass
+
+            for col_name, col_type, ref in targets:
                 try:
                     conn.execute(f"UPDATE {_dq(table)} SET {_dq(col_name)} = NULL")
                     applied += 1
@@ -528,6 +676,29 @@ def nullify_columns_in_duckdb(
         conn.close()
 
 
+def _fixes_marker(duck_db: Path) -> Path:
+    return duck_db.with_name(duck_db.name + ".fixes_applied")
+
+
+def _convert_one(job: tuple[str, Path, Path, bool]) -> bool:
+    db_id, sqlite_db, duck_db, force = job
+    marker = _fixes_marker(duck_db)
+    # The marker is touched only after apply_db_fixes succeeds, so an output that is
+    # newer than its SQLite source and carries the marker is complete and current.
+    if (
+        not force
+        and duck_db.is_file()
+        and marker.is_file()
+        and marker.stat().st_mtime >= sqlite_db.stat().st_mtime
+    ):
+        return False
+    _safe_unlink(marker)
+    convert_sqlite_to_duckdb(sqlite_db, duck_db, force=True)
+    apply_db_fixes(db_id, duck_db)
+    marker.touch()
+    return True
+
+
 @dataclass
 class EvalStats:
     total: int = 0
@@ -619,6 +790,17 @@ def main() -> int:
         action="store_true",
         help="Print missing/failed column details when dropping columns.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of worker processes for SQLite -> DuckDB conversion (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--force-convert",
+        action="store_true",
+        help="Re-convert every DB even if its DuckDB output is newer than the SQLite source.",
+    )
     args = parser.parse_args()
 
     db_root = Path(args.db_root).resolve()
@@ -632,12 +814,11 @@ def main() -> int:
     expected: dict[str, Any] = {}
     if args.compare_to == "gold":
         for p in sorted(gold_dir.glob("*_gold.jsonl")):
-            with p.open("r", encoding="utf-8") as f:
-                for line in f:
-                    if not line.strip():
-                        continue
-                    obj = json.loads(line)
-                    expected[obj["question_id"]] = obj["answer"]
+            for line in p.read_bytes().splitlines():
+                if not line.strip():
+                    continue
+                obj = _loads_json(line)
+                expected[obj["question_id"]] = obj["answer"]
 
     # Collect query CSVs (prefer non-hybrid; match export_gold_answers behavior minimally)
     csv_paths = sorted(questions_dir.glob("*Queries.csv"))
@@ -645,20 +826,28 @@ def main() -> int:
     if not csv_paths:
         raise SystemExit(f"No query CSVs found under: {questions_dir}")
 
-    # Default behavior: always convert SQLite -> DuckDB (overwriting outputs),
-    # then apply minimal per-DB fixes to reduce exec-time failures.
+    # Convert SQLite -> DuckDB (overwriting outputs), then apply minimal per-DB fixes to
+    # reduce exec-time failures. Outputs already up to date are kept unless --force-convert.
     sqlite_paths = sorted(
         p
         for p in db_root.rglob("*")
-        if p.is_file() and p.suffix.lower() in {".sqlite", ".sqlite3", ".db"} and _is_sqlite_file(p)
+        # Cheapest check first: the suffix test needs no syscall.
+        if p.suffix.lower() in {".sqlite", ".sqlite3", ".db"} and p.is_file() and _is_sqlite_file(p)
     )
+    # Each DB converts into its own output file, so conversions run in parallel.
+    # Keyed by db_id: if a folder holds several SQLite files, the last one wins as before.
+    convert_jobs: dict[str, tuple[str, Path, Path, bool]] = {}
     for sqlite_db in sqlite_paths:
         db_id = sqlite_db.parent.name
         if only_db and db_id != only_db:
             continue
-        duck_db = duckdb_out_root / f"{db_id}.duckdb"
-        convert_sqlite_to_duckdb(sqlite_db, duck_db, force=True)
-        apply_db_fixes(db_id, duck_db)
+        convert_jobs[db_id] = (db_id, sqlite_db, duckdb_out_root / f"{db_id}.duckdb", bool(args.force_convert))
+    if convert_jobs:
+        max_workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(convert_jobs))
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for db_id, converted in zip(convert_jobs, pool.map(_convert_one, convert_jobs.values())):
+                if not converted:
+                    print(f"[up-to-date] {db_id}: {duckdb_out_root / f'{db_id}.duckdb'}", file=sys.stderr)
 
     out_compatible = None
     if args.out_compatible:
@@ -697,6 +886,12 @@ def main() -> int:
         else:
             print("\nNo evaluated questions.")
 
+    # One connection per DB, kept open across evaluation passes (the drop-columns phase
+    # re-reads the same SQLite DBs, and --out-broken re-runs the dropped DuckDBs); opening
+    # a connection costs far more than the typical gold query.
+    duck_conn_caches: dict[Path, dict[str, duckdb.DuckDBPyConnection]] = {}
+    sqlite_conns: dict[str, sqlite3.Connection] = {}
+
     def _evaluate(
         duckdb_root: Path,
         *,
@@ -708,9 +903,11 @@ def main() -> int:
         compatible: set[tuple[str, str]] = set()
         compatible_records: dict[tuple[str, str], dict[str, Any]] = {}
 
+        duck_conns = duck_conn_caches.setdefault(duckdb_root, {})
+
         for csv_path in csv_paths:
             base = csv_path.stem
-            for row_idx, row in enumerate(_iter_csv_rows(csv_path), start=1):
+            for row_idx, row in enumerate(_read_csv_rows(csv_path), start=1):
                 if len(row) < 4:
                     continue
                 db_id = row[0].strip()
@@ -741,11 +938,10 @@ def main() -> int:
                         stats.exec_errors += 1
                         continue
                     try:
-                        sconn = sqlite3.connect(str(sqlite_db_path))
-                        try:
-                            sqlite_rows = sconn.execute(gold_sql).fetchall()
-                        finally:
-                            sconn.close()
+                        sconn = sqlite_conns.get(db_id)
+                        if sconn is None:
+                            sconn = sqlite_conns[db_id] = _connect_sqlite_ro(sqlite_db_path)
+                        sqlite_rows = sconn.execute(gold_sql).fetchall()
                     except Exception:
                         stats.exec_errors += 1
                         continue
@@ -769,14 +965,14 @@ def main() -> int:
                     stats.exec_errors += 1
                     continue
 
-                conn = duckdb.connect(str(duck_db_path), read_only=True)
+                conn = duck_conns.get(db_id)
+                if conn is None:
+                    conn = duck_conns[db_id] = _connect_duck_ro(duck_db_path)
                 try:
                     got = conn.execute(duck_sql).fetchall()
                 except Exception:
                     stats.exec_errors += 1
                     continue
-                finally:
-                    conn.close()
 
                 ok = False
                 if args.compare_to == "gold":
@@ -788,7 +984,8 @@ def main() -> int:
                     stats.correct += 1
                     if record_compatible:
                         compatible.add(key)
-                        if out_compatible is not None:
+                        # With --out-broken only the captured baseline records are written.
+                        if out_compatible is not None and (capture_records or not args.out_broken):
                             rec = {
                                 "question_id": qid,
                                 "db": db_id,
@@ -798,8 +995,7 @@ def main() -> int:
                                 "answer": _canonicalize_jsonable_rows(_jsonable_rows(got)),
                             }
                             if args.out_broken:
-                                if capture_records:
-                                    compatible_records[key] = rec
+                                compatible_records[key] = rec
                             else:
                                 out_compatible.write(json.dumps(rec, ensure_ascii=False) + "\n")
                 else:
@@ -818,7 +1014,8 @@ def main() -> int:
 
     # Phase 2: drop columns and re-evaluate only on the baseline-compatible subset
     if args.drop_columns:
-        cols_to_drop = pickle.load(open(args.drop_pickle, "rb"))
+        with open(args.drop_pickle, "rb") as f:
+            cols_to_drop = pickle.load(f)
         if not isinstance(cols_to_drop, dict):
             raise SystemExit(f"Unexpected pickle format: {type(cols_to_drop)}")
 
@@ -844,23 +1041,19 @@ def main() -> int:
                 verbose=bool(args.verbose_drop),
             )
 
-        dropped_by_db, _still_compatible, _ = _evaluate(
+        # One pass over the dropped DBs: with --out-broken it also records which
+        # compatible keys still match.
+        want_broken = bool(args.out_broken and out_compatible is not None)
+        dropped_by_db, still_ok, _ = _evaluate(
             drop_dst_root,
             restrict_to=compatible,
-            record_compatible=False,
+            record_compatible=want_broken,
             capture_records=False,
         )
         print(f"\nBaseline-compatible subset size: {len(compatible)}")
         _report("After dropping columns (evaluated only on baseline-compatible subset)", drop_dst_root, dropped_by_db)
 
-        if args.out_broken and out_compatible is not None:
-            # Re-evaluate on dropped DBs to find which compatible keys remain correct.
-            _, still_ok, _ = _evaluate(
-                drop_dst_root,
-                restrict_to=compatible,
-                record_compatible=True,
-                capture_records=False,
-            )
+        if want_broken:
             broken = compatible - still_ok
             for key in sorted(broken):
                 rec = baseline_records.get(key)
@@ -869,6 +1062,11 @@ def main() -> int:
 
     if out_compatible is not None:
         out_compatible.close()
+    for cache in duck_conn_caches.values():
+        for c in cache.values():
+            c.close()
+    for c in sqlite_conns.values():
+        c.close()
 
     return 0
 
@@ -4,9 +4,13 @@ from __future__ import annotations
 import argparse
 import base64
 import json
+import math
 import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from decimal import Decimal
-from typing import Any
+from typing import Any, Callable
 
 
 def _require_import(name: str):
@@ -21,8 +25,44 @@ def _require_import(name: str):
 
 duckdb = _require_import("duckdb")
 
+try:
+    import orjson  # optional: faster JSON encoding/decoding; stdlib json is the fallback
+except ImportError:
+    orjson = None
+
+
+def _loads_json(data: bytes | str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN/Infinity or huge ints, which stdlib json accepts but orjson rejects.
+            pass
+    return json.loads(data)
+
+
+def _has_nonfinite(x: Any) -> bool:
+    if type(x) is float:
+        return not math.isfinite(x)
+    if isinstance(x, list):
+        return any(map(_has_nonfinite, x))
+    if isinstance(x, dict):
+        return any(map(_has_nonfinite, x.values()))
+    return False
+
 
 def _stable_key(x: Any) -> str:
+    if orjson is not None:
+        try:
+            key = orjson.dumps(x, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            # e.g. ints beyond 64 bits
+            pass
+        else:
+            # orjson writes NaN/Infinity as null, which would make them match a real null;
+            # only a key containing null can hide one, so only those are checked.
+            if b"null" not in key or not _has_nonfinite(x):
+                return key.decode("utf-8")
     return json.dumps(x, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
 
 
@@ -45,12 +85,106 @@ def _jsonable_scalar(x: Any) -> Any:
     return {"__type__": "py_repr", "py_type": type(x).__name__, "repr": repr(x)}
 
 
-def _jsonable_rows(rows: list[tuple[Any, ...]]) -> list[list[Any]]:
-    return [[_jsonable_scalar(v) for v in row] for row in rows]
+# DuckDB result types whose Python values are already JSON-native (None/bool/int/float/str).
+_JSON_NATIVE_TYPES = frozenset(
+    {
+        "BOOLEAN",
+        "TINYINT",
+        "SMALLINT",
+        "INTEGER",
+        "BIGINT",
+        "HUGEINT",
+        "UTINYINT",
+        "USMALLINT",
+        "UINTEGER",
+        "UBIGINT",
+        "UHUGEINT",
+        "FLOAT",
+        "DOUBLE",
+        "VARCHAR",
+    }
+)
+
+
+def _fetch_jsonable_rows(conn: Any, sql: str) -> list[list[Any]]:
+    # Rows as lists of JSON-able values. Conversion is decided per column from the result
+    # schema: only columns of non-native types (DECIMAL, DATE, BLOB, ...) go through
+    # _jsonable_scalar; the rest pass through as fetched.
+    rows = conn.execute(sql).fetchall()
+    convert = [i for i, d in enumerate(conn.description or ()) if str(d[1]) not in _JSON_NATIVE_TYPES]
+    out = [list(r) for r in rows]
+    if convert:
+        for r in out:
+            for i in convert:
+                r[i] = _jsonable_scalar(r[i])
+    return out
+
+
+# _value_key tags. bool, int and float are told apart; _loose_row_key merges them.
+_NUMERIC_TAGS = frozenset({1, 2, 3})
 
 
-def _canonicalize_rows(rows: list[list[Any]]) -> list[list[Any]]:
-    return sorted(rows, key=_stable_key)
+def _value_key(v: Any) -> tuple[Any, ...]:
+    # Hashable, type-tagged key: equal keys mean equal JSON text. Only dicts
+    # (bytes / py_repr wrappers) and lists still go through JSON.
+    if v is None:
+        return (0,)
+    if isinstance(v, bool):
+        return (1, v)
+    if isinstance(v, int):
+        return (2, v)
+    if isinstance(v, float):
+        # -0.0 == 0.0, but the two have different JSON text.
+        return (3, v) if v else (3, v, math.copysign(1.0, v))
+    if isinstance(v, str):
+        return (4, v)
+    return (5, _stable_key(v))
+
+
+def _row_key(row: list[Any]) -> tuple[Any, ...]:
+    if not isinstance(row, list):
+        return ((6, _stable_key(row)),)
+    return tuple(map(_value_key, row))
+
+
+def _loose_row_key(key: tuple[Any, ...]) -> tuple[Any, ...]:
+    # The row key with bool/int/float in one group, so values that compare equal
+    # (1, 1.0, True) get equal keys.
+    return tuple((1, k[1]) if k[0] in _NUMERIC_TAGS else k for k in key)
+
+
+def _canonical_rows(rows: list[Any]) -> list[Any]:
+    # Rows sorted by their stdlib JSON text: the order the original sort-and-compare
+    # check used.
+    return sorted(rows, key=lambda r: json.dumps(r, sort_keys=True, ensure_ascii=False, separators=(",", ":")))
+
+
+def _answer_matcher(expected: list[Any]) -> Callable[[list[Any]], bool]:
+    # Checks a result against the expected rows; built once per record and applied to
+    # both the baseline and the dropped-column result.
+    expected_keys = list(map(_row_key, expected))
+    expected_c = Counter(expected_keys)
+    expected_loose_c: Counter[tuple[Any, ...]] | None = None
+
+    def matches(got: list[Any]) -> bool:
+        # Pass/fail is that of sorting both sides by JSON text and comparing the rows
+        # with ==. Multisets of row keys settle almost every record without sorting.
+        nonlocal expected_loose_c
+        if len(got) != len(expected):
+            return False
+        got_keys = list(map(_row_key, got))
+        # Equal typed keys mean the sorted rows are identical.
+        if Counter(got_keys) == expected_c:
+            return True
+        # == also holds across 1, 1.0 and True. Unless the loose multisets agree no
+        # pairing of equal rows exists; if they do, the sorted rows decide.
+        if expected_loose_c is None:
+            expected_loose_c = Counter(map(_loose_row_key, expected_keys))
+        if Counter(map(_loose_row_key, got_keys)) != expected_loose_c:
+            return False
+        return _canonical_rows(got) == _canonical_rows(expected)
+
+    return matches
 
 
 def main() -> int:
@@ -81,80 +215,135 @@ def main() -> int:
         default=0,
         help="If >0, only process first N JSONL records.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of worker threads executing records concurrently (default: one per CPU).",
+    )
     args = parser.parse_args()
 
     out_path = args.out_jsonl
     base_dir = args.duckdb_dir
     drop_dir = args.duckdb_dropped_dir
 
-    base_conns: dict[str, Any] = {}
-    drop_conns: dict[str, Any] = {}
+    # Every DuckDB file is ATTACHed (read-only) to one in-memory instance instead of
+    # getting its own connection; a query runs after USE-ing its file's catalog.
+    con = duckdb.connect(":memory:")
+    attached: dict[str, str] = {}  # path -> catalog alias
+    cursors_opened: list[Any] = []
+    con_lock = threading.Lock()
+    # DuckDB connections are not safe to share across threads; each worker thread runs
+    # its queries on its own cursor (a child connection onto the same instance).
+    local = threading.local()
+
+    def get_cursor(path: str):
+        cur = getattr(local, "cursor", None)
+        if cur is None:
+            with con_lock:
+                cur = con.cursor()
+                cursors_opened.append(cur)
+            local.cursor = cur
+            local.current = None
+        alias = attached.get(path)
+        if alias is None:
+            with con_lock:
+                alias = attached.get(path)
+                if alias is None:
+                    alias = f"validate_db{len(attached)}"
+                    path_lit = path.replace("'", "''")
+                    con.execute(f"ATTACH '{path_lit}' AS {alias} (READ_ONLY)")
+                    attached[path] = alias
+        if local.current != alias:
+            cur.execute(f"USE {alias}")
+            local.current = alias
+        return cur
+
+    # Results of (file, duck_sql) pairs that more than one record executes, each kept
+    # only until its last use. uses_left (remaining uses per repeated pair) is filled in
+    # once the records are read.
+    uses_left: dict[tuple[str, str], int] = {}
+    result_cache: dict[tuple[str, str], list[list[Any]]] = {}
+    cache_lock = threading.Lock()
+
+    def fetch(path: str, sql: str) -> list[list[Any]]:
+        key = (path, sql)
+        if key not in uses_left:
+            return _fetch_jsonable_rows(get_cursor(path), sql)
+        rows = result_cache.get(key)
+        try:
+            if rows is None:
+                rows = _fetch_jsonable_rows(get_cursor(path), sql)
+        finally:
+            with cache_lock:
+                uses_left[key] -= 1
+                if uses_left[key] == 0:
+                    result_cache.pop(key, None)
+                elif rows is not None:
+                    result_cache[key] = rows
+        return rows
+
+    def run_one(rec: dict[str, Any]) -> tuple[bool, bool, bool, bool]:
+        db_id = rec["db"]
+        duck_sql = rec["duck_sql"]
+        expected = rec.get("answer", [])
+        matches = _answer_matcher(expected if isinstance(expected, list) else [])
+
+        base_path = os.path.join(base_dir, f"{db_id}.duckdb")
+        drop_path = os.path.join(drop_dir, f"{db_id}.duckdb")
+
+        # Baseline
+        ok = err = False
+        try:
+            ok = matches(fetch(base_path, duck_sql))
+        except Exception:
+            err = True
+
+        # Dropped-column
+        ok2 = err2 = False
+        try:
+            ok2 = matches(fetch(drop_path, duck_sql))
+        except Exception:
+            err2 = True
+
+        return ok, err, ok2, err2
+
+    records: list[dict[str, Any]] = []
+    with open(out_path, "rb") as f:
+        for i, line in enumerate(f, start=1):
+            if args.limit and i > args.limit:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            records.append(_loads_json(line))
+
+    # The same query can recur across records (e.g. question variants sharing gold SQL);
+    # execute it once per DB file and reuse the rows.
+    uses = Counter(
+        (os.path.join(root, f"{rec['db']}.duckdb"), rec["duck_sql"])
+        for rec in records
+        for root in (base_dir, drop_dir)
+    )
+    uses_left.update((key, n) for key, n in uses.items() if n > 1)
 
-    total = 0
+    total = len(records)
     base_ok = 0
     drop_ok = 0
     base_err = 0
     drop_err = 0
 
-    def get_conn(cache: dict[str, Any], path: str):
-        c = cache.get(path)
-        if c is None:
-            c = duckdb.connect(path, read_only=True)
-            cache[path] = c
-        return c
-
+    # DuckDB releases the GIL while a query runs, so records overlap across threads.
+    max_workers = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
     try:
-        with open(out_path, "r", encoding="utf-8") as f:
-            for i, line in enumerate(f, start=1):
-                if args.limit and i > args.limit:
-                    break
-                line = line.strip()
-                if not line:
-                    continue
-
-                rec = json.loads(line)
-                db_id = rec["db"]
-                duck_sql = rec["duck_sql"]
-                expected = rec.get("answer", [])
-                expected_c = _canonicalize_rows(expected if isinstance(expected, list) else [])
-
-                total += 1
-
-                base_path = os.path.join(base_dir, f"{db_id}.duckdb")
-                drop_path = os.path.join(drop_dir, f"{db_id}.duckdb")
-
-                # Baseline
-                try:
-                    c = get_conn(base_conns, base_path)
-                    got = c.execute(duck_sql).fetchall()
-                    got_c = _canonicalize_rows(_jsonable_rows(got))
-                    if got_c == expected_c:
-                        base_ok += 1
-                    else:
-                        # mismatch
-                        pass
-                except Exception:
-                    base_err += 1
-
-                # Dropped-column
-                try:
-                    c2 = get_conn(drop_conns, drop_path)
-                    got2 = c2.execute(duck_sql).fetchall()
-                    got2_c = _canonicalize_rows(_jsonable_rows(got2))
-                    if got2_c == expected_c:
-                        drop_ok += 1
-                    else:
-                        pass
-                except Exception:
-                    drop_err += 1
-
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            for ok, err, ok2, err2 in ex.map(run_one, records):
+                base_ok += ok
+                base_err += err
+                drop_ok += ok2
+                drop_err += err2
     finally:
-        for c in list(base_conns.values()):
-            try:
-                c.close()
-            except Exception:
-                pass
-        for c in list(drop_conns.values()):
+        for c in cursors_opened + [con]:
             try:
                 c.close()
             except Exception:
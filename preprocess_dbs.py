@@ -8,20 +8,15 @@ import re
 import shutil
 import sqlite3
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Iterable, Optional
+from functools import lru_cache
+from typing import Any, Optional
 
 
-PAIR_RE = re.compile(
-    r"""
-    (?:
-        (?P<table_bt>[A-Za-z0-9_]+)\.\`(?P<col_bt>[^`]+)\`
-      |
-        (?P<table>[A-Za-z0-9_]+)\.(?P<col>[A-Za-z0-9_]+)
-    )
-    """,
-    re.VERBOSE,
-)
+# Backticked "table.`col with spaces`" or plain "table.col". Numbered groups so findall
+# hands back plain tuples (no per-match Match objects or group-name lookups).
+PAIR_RE = re.compile(r"([A-Za-z0-9_]+)\.`([^`]+)`|([A-Za-z0-9_]+)\.([A-Za-z0-9_]+)")
 
 
 @dataclass
@@ -32,21 +27,25 @@ class ColInfo:
     pk: bool
 
 
-def _iter_pairs(expr: str) -> Iterable[tuple[str, str]]:
+@lru_cache(maxsize=4096)
+def _parse_ref(expr: str) -> tuple[tuple[str, str], ...]:
     # Handles normal "table.col" and "table.`col with spaces`" cases, and also
     # malformed concatenations in the pickle by extracting all recognizable pairs.
-    matches = list(PAIR_RE.finditer(expr))
-    if not matches:
+    # Cached: the same references recur across DBs handled by one worker.
+    pairs = PAIR_RE.findall(expr)
+    if not pairs:
         if "." in expr:
             table, col = expr.split(".", 1)
-            yield table.strip(), col.strip().strip("`")
-        return
+            return ((table.strip(), col.strip().strip("`")),)
+        return ()
 
-    for m in matches:
-        table = (m.group("table_bt") or m.group("table") or "").strip()
-        col = (m.group("col_bt") or m.group("col") or "").strip()
+    out: list[tuple[str, str]] = []
+    for table_bt, col_bt, table, col in pairs:
+        table = (table_bt or table).strip()
+        col = (col_bt or col).strip()
         if table and col:
-            yield table, col
+            out.append((table, col))
+    return tuple(out)
 
 
 def _list_tables(conn: sqlite3.Connection) -> dict[str, str]:
@@ -95,35 +94,6 @@ def _can_use_rowid(conn: sqlite3.Connection, table: str) -> bool:
         return False
 
 
-def _apply_unique_dummy(
-    conn: sqlite3.Connection, table: str, col_info: ColInfo, *, verbose: bool
-) -> Optional[str]:
-    # For NOT NULL + UNIQUE columns, we can't set a single empty value across all rows.
-    # Replace with per-row dummy values derived from rowid.
-    if not _can_use_rowid(conn, table):
-        return "no rowid available for per-row dummy update"
-
-    t = (col_info.decl_type or "").upper()
-    try:
-        if any(x in t for x in ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC", "BOOL")):
-            # If it's also an INTEGER PRIMARY KEY aliasing rowid, make it negative to destroy ids.
-            expr = "-rowid" if col_info.pk and "INT" in t else "rowid"
-            conn.execute(f'UPDATE "{table}" SET "{col_info.name}" = {expr}')
-        else:
-            conn.execute(
-                f'UPDATE "{table}" SET "{col_info.name}" = printf(?, rowid)',
-                ("__DROPPED__%d",),
-            )
-        if verbose:
-            print(
-                f"[warn] {table}.{col_info.name} is NOT NULL + UNIQUE; set to per-row dummy values",
-                file=sys.stderr,
-            )
-        return None
-    except Exception as e:
-        return f"{type(e).__name__}: {e}"
-
-
 def _resolve_table_name(
     table_raw: str, table_map: dict[str, str], aliases: dict[str, str]
 ) -> Optional[str]:
@@ -132,35 +102,69 @@ def _resolve_table_name(
     return table_map.get(t_norm)
 
 
-def _apply_nullify(
+@dataclass
+class Fallback:
+    # Replacement written when a column cannot be set to NULL.
+    set_sql: str
+    params: tuple[Any, ...]
+    warning: str
+
+
+def _plan_fallback(
     conn: sqlite3.Connection,
     table: str,
     col: str,
     col_info: ColInfo,
+    null_error: Exception,
     *,
     unique_cols: set[str],
-    verbose: bool,
-) -> Optional[str]:
+) -> Fallback | str:
+    # Returns the SET assignment to use instead of NULL, or an error string if none fits.
+    if col_info.notnull and (col_info.pk or col_info.name.lower() in unique_cols):
+        # For NOT NULL + UNIQUE columns, we can't set a single empty value across all rows.
+        # Replace with per-row dummy values derived from rowid.
+        if not _can_use_rowid(conn, table):
+            return "no rowid available for per-row dummy update"
+        warning = f"[warn] {table}.{col_info.name} is NOT NULL + UNIQUE; set to per-row dummy values"
+        t = (col_info.decl_type or "").upper()
+        if any(x in t for x in ("INT", "REAL", "FLOA", "DOUB", "NUM", "DEC", "BOOL")):
+            # If it's also an INTEGER PRIMARY KEY aliasing rowid, make it negative to destroy ids.
+            expr = "-rowid" if col_info.pk and "INT" in t else "rowid"
+            return Fallback(f'"{col_info.name}" = {expr}', (), warning)
+        return Fallback(f'"{col_info.name}" = printf(?, rowid)', ("__DROPPED__%d",), warning)
+
+    # Fall back for NOT NULL / CHECK constraints by using an "empty" value.
+    empty = _empty_value(col_info)
+    return Fallback(
+        f'"{col_info.name}" = ?',
+        (empty,),
+        f"[warn] {table}.{col} could not be NULL ({type(null_error).__name__}: {null_error}); "
+        f"set to {empty!r} instead",
+    )
+
+
+_FICLONE = 0x40049409  # Linux ioctl: share the source's extents (reflink)
+
+
+def _clone_file(src: str | os.PathLike[str], dst: str | os.PathLike[str]) -> None:
+    # Like shutil.copy2, but try a copy-on-write clone first (near-free on Btrfs/XFS),
+    # then an in-kernel copy_file_range; anything unsupported falls back to copy2.
     try:
-        conn.execute(f'UPDATE "{table}" SET "{col_info.name}" = NULL')
-        return None
-    except Exception as e:
-        if col_info.notnull and (col_info.pk or col_info.name.lower() in unique_cols):
-            return _apply_unique_dummy(conn, table, col_info, verbose=verbose)
-
-        # Fall back for NOT NULL / CHECK constraints by using an "empty" value.
-        try:
-            empty = _empty_value(col_info)
-            conn.execute(f'UPDATE "{table}" SET "{col_info.name}" = ?', (empty,))
-            if verbose:
-                print(
-                    f"[warn] {table}.{col} could not be NULL ({type(e).__name__}: {e}); "
-                    f"set to {empty!r} instead",
-                    file=sys.stderr,
-                )
-            return None
-        except Exception as e2:
-            return f"{type(e2).__name__}: {e2}"
+        import fcntl
+
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+            except OSError:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if n == 0:
+                        raise OSError("copy_file_range stopped early")
+                    remaining -= n
+        shutil.copystat(src, dst)
+    except (ImportError, AttributeError, OSError):
+        shutil.copy2(src, dst)
 
 
 def process_db(
@@ -172,23 +176,41 @@ def process_db(
     verbose: bool,
 ) -> int:
     os.makedirs(os.path.dirname(dst_db_path), exist_ok=True)
-    shutil.copy2(src_db_path, dst_db_path)
+    _clone_file(src_db_path, dst_db_path)
 
-    conn = sqlite3.connect(dst_db_path)
+    # Autocommit mode so the single explicit transaction below is the only one.
+    conn = sqlite3.connect(dst_db_path, isolation_level=None)
     try:
         conn.execute("PRAGMA foreign_keys = OFF")
+        # The destination is a throwaway copy: no fsyncs, no on-disk rollback journal.
+        # The journal stays in memory (not OFF) so a failed UPDATE still rolls back
+        # cleanly before the fallback UPDATEs run.
+        conn.execute("PRAGMA journal_mode = MEMORY")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+        # Read pages through a memory map and keep a 64 MiB page cache for the repeated
+        # PRAGMA lookups and table scans.
+        conn.execute("PRAGMA mmap_size = 268435456")
+        conn.execute("PRAGMA cache_size = -65536")
+        conn.execute("BEGIN")
         table_map = _list_tables(conn)
         table_aliases = {
             # observed typo in columns_to_drop.pickle
             "fprm": "frpm",
         }
+        # Only UPDATEs run below, so each table's PRAGMA results stay valid.
+        table_info_cache: dict[str, dict[str, ColInfo]] = {}
+        unique_cache: dict[str, set[str]] = {}
 
         applied = 0
         failed = 0
         missing = 0
 
+        # Pass 1: resolve every reference, grouping the target columns per table.
+        per_table: dict[str, list[tuple[str, ColInfo, str]]] = {}
         for ref in columns:
-            for table_raw, col_raw in _iter_pairs(ref):
+            for table_raw, col_raw in _parse_ref(ref):
                 table = _resolve_table_name(table_raw, table_map, table_aliases)
                 if not table:
                     missing += 1
@@ -196,7 +218,9 @@ def process_db(
                         print(f"[missing-table] {db_id}: {table_raw} (from {ref!r})", file=sys.stderr)
                     continue
 
-                col_map = _table_info(conn, table)
+                col_map = table_info_cache.get(table)
+                if col_map is None:
+                    col_map = table_info_cache[table] = _table_info(conn, table)
                 ci = col_map.get(col_raw.lower())
                 if not ci:
                     missing += 1
@@ -207,8 +231,56 @@ def process_db(
                         )
                     continue
 
-                uniq = _unique_cols(conn, table)
-                err = _apply_nullify(conn, table, col_raw, ci, unique_cols=uniq, verbose=verbose)
+                per_table.setdefault(table, []).append((col_raw, ci, ref))
+
+        # Pass 2: one multi-column UPDATE per table, so each table is scanned once. If it
+        # fails (NOT NULL / UNIQUE / CHECK), redo that table column by column.
+        for table, targets in per_table.items():
+            set_clause = ", ".join(
+                f'"{name}" = NULL' for name in dict.fromkeys(ci.name for _, ci, _ in targets)
+            )
+            try:
+                conn.execute(f'UPDATE "{table}" SET {set_clause}')
+                applied += len(targets)
+                continue
+            except Exception:
+                pass
+
+            uniq = unique_cache.get(table)
+            if uniq is None:
+                uniq = unique_cache[table] = _unique_cols(conn, table)
+            outcomes: list[tuple[ColInfo, str, Fallback | str | None]] = []
+            for col_raw, ci, ref in targets:
+                try:
+                    conn.execute(f'UPDATE "{table}" SET "{ci.name}" = NULL')
+                    outcomes.append((ci, ref, None))
+                except Exception as e:
+                    outcomes.append((ci, ref, _plan_fallback(conn, table, col_raw, ci, e, unique_cols=uniq)))
+
+            # Write every column's fallback (per-row dummies / empty values) in one more
+            # scan of the table; if that fails, apply them one column at a time.
+            plans = {ci.name: o for ci, _, o in outcomes if isinstance(o, Fallback)}
+            batch_ok = False
+            if plans:
+                try:
+                    conn.execute(
+                        f'UPDATE "{table}" SET ' + ", ".join(fb.set_sql for fb in plans.values()),
+                        tuple(x for fb in plans.values() for x in fb.params),
+                    )
+                    batch_ok = True
+                except Exception:
+                    pass
+
+            for ci, ref, outcome in outcomes:
+                err = outcome if isinstance(outcome, str) else None
+                if isinstance(outcome, Fallback):
+                    if not batch_ok:
+                        try:
+                            conn.execute(f'UPDATE "{table}" SET {outcome.set_sql}', outcome.params)
+                        except Exception as e:
+                            err = f"{type(e).__name__}: {e}"
+                    if err is None and verbose:
+                        print(outcome.warning, file=sys.stderr)
                 if err is None:
                     applied += 1
                 else:
@@ -229,6 +301,17 @@ def process_db(
         conn.close()
 
 
+def _process_one(job: tuple[str, str, str, list[str], bool]) -> int:
+    db_id, src_db_path, dst_db_path, columns, verbose = job
+    return process_db(
+        db_id=db_id,
+        src_db_path=src_db_path,
+        dst_db_path=dst_db_path,
+        columns=columns,
+        verbose=verbose,
+    )
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description=(
@@ -261,6 +344,12 @@ def main() -> int:
         action="store_true",
         help="Print missing/failed columns details.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of worker processes; each DB is processed independently (default: one per CPU).",
+    )
     args = parser.parse_args()
 
     cols_to_drop = pickle.load(open(args.pickle, "rb"))
@@ -270,6 +359,9 @@ def main() -> int:
     db_ids = [args.db] if args.db else list(cols_to_drop.keys())
     exit_code = 0
 
+    # Each DB is copied to its own destination and opened on its own connection, so
+    # they are processed in parallel.
+    jobs: list[tuple[str, str, str, list[str], bool]] = []
     for db_id in db_ids:
         if db_id not in cols_to_drop:
             raise SystemExit(f"DB id not in pickle: {db_id}")
@@ -288,14 +380,13 @@ def main() -> int:
             exit_code = max(exit_code, 2)
             continue
 
-        rc = process_db(
-            db_id=db_id,
-            src_db_path=src_db_path,
-            dst_db_path=dst_db_path,
-            columns=columns,
-            verbose=bool(args.verbose),
-        )
-        exit_code = max(exit_code, rc)
+        jobs.append((db_id, src_db_path, dst_db_path, columns, bool(args.verbose)))
+
+    if jobs:
+        max_workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(jobs))
+        with ProcessPoolExecutor(max_workers=max_workers) as ex:
+            for rc in ex.map(_process_one, jobs):
+                exit_code = max(exit_code, rc)
 
     return exit_code
 
@@ -2,20 +2,61 @@
 from __future__ import annotations
 
 import argparse
-import glob
+import fnmatch
 import json
+import math
 import os
+import re
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from typing import Any, Iterable
 
-
-def _stable_key(x: Any) -> str:
-    # Stable serialization so we can multiset-intersect rows/items exactly.
-    return json.dumps(x, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+try:
+    import orjson  # optional: faster JSON decoding; stdlib json is the fallback
+except ImportError:
+    orjson = None
+
+
+def _loads_json(data: bytes | str) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # e.g. NaN/Infinity or huge ints, which stdlib json accepts but orjson rejects.
+            pass
+    return json.loads(data)
+
+
+def _has_nonfinite(x: Any) -> bool:
+    if type(x) is float:
+        return not math.isfinite(x)
+    if isinstance(x, list):
+        return any(map(_has_nonfinite, x))
+    if isinstance(x, dict):
+        return any(map(_has_nonfinite, x.values()))
+    return False
+
+
+def _stable_key(x: Any) -> bytes:
+    # Stable serialization so we can multiset-intersect rows/items exactly. Kept as bytes
+    # (hashable, smaller than str, and what orjson produces anyway).
+    if orjson is not None:
+        try:
+            key = orjson.dumps(x, option=orjson.OPT_SORT_KEYS)
+        except TypeError:
+            # e.g. ints beyond 64 bits
+            pass
+        else:
+            # orjson writes NaN/Infinity as null, which would make them match a real null;
+            # only a key containing null can hide one, so only those are checked.
+            if b"null" not in key or not _has_nonfinite(x):
+                return key
+    # surrogatepass: lone surrogates (which orjson rejects) are valid in the decoded JSON.
+    return json.dumps(x, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode("utf-8", "surrogatepass")
 
 
-def _as_counter(answer: Any) -> Counter[str]:
+def _as_counter(answer: Any) -> Counter[bytes]:
     # Answer format is expected to be list-of-rows (list of lists), but we defensively
     # handle non-lists by treating them as a single item.
     if isinstance(answer, list):
@@ -23,7 +64,7 @@ def _as_counter(answer: Any) -> Counter[str]:
     return Counter({_stable_key(answer): 1})
 
 
-def _intersection_count(a: Counter[str], b: Counter[str]) -> int:
+def _intersection_count(a: Counter[bytes], b: Counter[bytes]) -> int:
     return sum((a & b).values())
 
 
@@ -40,12 +81,13 @@ class FileStats:
 
 def _load_jsonl_by_qid(path: str) -> dict[str, dict[str, Any]]:
     out: dict[str, dict[str, Any]] = {}
-    with open(path, "r", encoding="utf-8") as f:
+    # Bytes straight to the parser: no decode or strip() copy per line; both JSON parsers
+    # accept the surrounding whitespace/newline.
+    with open(path, "rb") as f:
         for line_no, line in enumerate(f, start=1):
-            line = line.strip()
-            if not line:
+            if line.isspace():
                 continue
-            rec = json.loads(line)
+            rec = _loads_json(line)
             qid = rec.get("question_id")
             if not isinstance(qid, str) or not qid:
                 raise ValueError(f"{path}:{line_no} missing/invalid question_id")
@@ -53,9 +95,25 @@ def _load_jsonl_by_qid(path: str) -> dict[str, dict[str, Any]]:
     return out
 
 
+def _match_files(dir_path: str, pattern: str) -> dict[str, str]:
+    # One readdir pass instead of glob; like glob, skip dotfiles unless the pattern asks
+    # for them and treat a missing directory as empty.
+    match = re.compile(fnmatch.translate(os.path.normcase(pattern))).match
+    hidden_ok = pattern.startswith(".")
+    try:
+        with os.scandir(dir_path) as it:
+            return {
+                e.name: e.path
+                for e in it
+                if (hidden_ok or not e.name.startswith(".")) and match(os.path.normcase(e.name))
+            }
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+
+
 def _iter_shared_files(gold_dir: str, new_dir: str, pattern: str) -> Iterable[tuple[str, str, str]]:
-    gold_files = {os.path.basename(p): p for p in glob.glob(os.path.join(gold_dir, pattern))}
-    new_files = {os.path.basename(p): p for p in glob.glob(os.path.join(new_dir, pattern))}
+    gold_files = _match_files(gold_dir, pattern)
+    new_files = _match_files(new_dir, pattern)
     for name in sorted(set(gold_files) | set(new_files)):
         yield name, gold_files.get(name, ""), new_files.get(name, "")
 
@@ -82,12 +140,20 @@ def compare_file(name: str, gold_path: str, new_path: str) -> FileStats:
         g_ans = gold[qid].get("answer")
         n_ans = new[qid].get("answer")
 
+        # Same item count _as_counter(g_ans) would hold.
+        g_items = len(g_ans) if isinstance(g_ans, list) else 1
+        gold_items += g_items
+
         if g_ans == n_ans:
             exact += 1
+            # == also holds for 1 vs 1.0 vs true, which the item keys tell apart; identical
+            # serializations mean every item matches, so skip building both Counters.
+            if _stable_key(g_ans) == _stable_key(n_ans):
+                matched_items += g_items
+                continue
 
         g_ctr = _as_counter(g_ans)
         n_ctr = _as_counter(n_ans)
-        gold_items += sum(g_ctr.values())
         matched_items += _intersection_count(g_ctr, n_ctr)
 
     n = len(all_qids) - missing_in_new - missing_in_gold
@@ -102,6 +168,31 @@ def compare_file(name: str, gold_path: str, new_path: str) -> FileStats:
     )
 
 
+def _compare_job(job: tuple[str, str, str]) -> FileStats:
+    name, gold_path, new_path = job
+    if not gold_path:
+        return FileStats(
+            file=name,
+            n=0,
+            exact=0,
+            missing_in_new=0,
+            missing_in_gold=len(_load_jsonl_by_qid(new_path)),
+            gold_items=0,
+            matched_items=0,
+        )
+    if not new_path:
+        return FileStats(
+            file=name,
+            n=0,
+            exact=0,
+            missing_in_new=len(_load_jsonl_by_qid(gold_path)),
+            missing_in_gold=0,
+            gold_items=0,
+            matched_items=0,
+        )
+    return compare_file(name, gold_path, new_path)
+
+
 def main() -> int:
     parser = argparse.ArgumentParser(
         description=(
@@ -125,6 +216,12 @@ def main() -> int:
         default="*_gold.jsonl",
         help='Filename glob to compare within each dir (default: "*_gold.jsonl").',
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of worker processes; each file pair is compared independently (default: one per CPU).",
+    )
     args = parser.parse_args()
 
     gold_dir = os.path.abspath(args.gold_dir)
@@ -137,48 +234,30 @@ def main() -> int:
     total_gold_items = 0
     total_matched_items = 0
 
-    any_files = False
-    for name, gold_path, new_path in _iter_shared_files(gold_dir, new_dir, args.pattern):
-        if not gold_path and not new_path:
-            continue
-        any_files = True
-        if not gold_path:
-            stats = FileStats(
-                file=name,
-                n=0,
-                exact=0,
-                missing_in_new=0,
-                missing_in_gold=len(_load_jsonl_by_qid(new_path)),
-                gold_items=0,
-                matched_items=0,
-            )
-        elif not new_path:
-            stats = FileStats(
-                file=name,
-                n=0,
-                exact=0,
-                missing_in_new=len(_load_jsonl_by_qid(gold_path)),
-                missing_in_gold=0,
-                gold_items=0,
-                matched_items=0,
+    jobs = [
+        (name, gold_path, new_path)
+        for name, gold_path, new_path in _iter_shared_files(gold_dir, new_dir, args.pattern)
+        if gold_path or new_path
+    ]
+    any_files = bool(jobs)
+    # File pairs are independent: parse and count them in parallel, report in order.
+    max_workers = max(1, min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(jobs)))
+    with ProcessPoolExecutor(max_workers=max_workers) as ex:
+        for stats in ex.map(_compare_job, jobs):
+            total_n += stats.n
+            total_exact += stats.exact
+            total_missing_in_new += stats.missing_in_new
+            total_missing_in_gold += stats.missing_in_gold
+            total_gold_items += stats.gold_items
+            total_matched_items += stats.matched_items
+
+            exact_acc = (stats.exact / stats.n) if stats.n else 0.0
+            fine_acc = (stats.matched_items / stats.gold_items) if stats.gold_items else 0.0
+            print(
+                f"{stats.file}: n={stats.n} exact={stats.exact} ({exact_acc:.3f}) "
+                f"fine={stats.matched_items}/{stats.gold_items} ({fine_acc:.3f}) "
+                f"missing_in_new={stats.missing_in_new} missing_in_gold={stats.missing_in_gold}"
             )
-        else:
-            stats = compare_file(name, gold_path, new_path)
-
-        total_n += stats.n
-        total_exact += stats.exact
-        total_missing_in_new += stats.missing_in_new
-        total_missing_in_gold += stats.missing_in_gold
-        total_gold_items += stats.gold_items
-        total_matched_items += stats.matched_items
-
-        exact_acc = (stats.exact / stats.n) if stats.n else 0.0
-        fine_acc = (stats.matched_items / stats.gold_items) if stats.gold_items else 0.0
-        print(
-            f"{stats.file}: n={stats.n} exact={stats.exact} ({exact_acc:.3f}) "
-            f"fine={stats.matched_items}/{stats.gold_items} ({fine_acc:.3f}) "
-            f"missing_in_new={stats.missing_in_new} missing_in_gold={stats.missing_in_gold}"
-        )
 
     if not any_files:
         raise SystemExit(
@@ -4,20 +4,19 @@ from __future__ import annotations
 import argparse
 import base64
 import csv
+import filecmp
+import gc
 import glob
+import hashlib
 import json
 import os
+import re
 import sqlite3
 import sys
-from dataclasses import dataclass
-from typing import Any, Iterable, Optional
-
-
-@dataclass(frozen=True)
-class ExecOutcome:
-    ok: bool
-    result: Optional[list[list[Any]]] = None
-    error: Optional[str] = None
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable
 
 
 def _jsonable_scalar(x: Any) -> Any:
@@ -26,36 +25,124 @@ def _jsonable_scalar(x: Any) -> Any:
     if isinstance(x, (bool, int, float, str)):
         return x
     if isinstance(x, (bytes, bytearray, memoryview)):
-        raw = bytes(x)
+        # b64encode reads any C-contiguous buffer directly; only other memoryviews are copied.
+        raw = x.tobytes() if isinstance(x, memoryview) and not x.c_contiguous else x
         return {"__type__": "bytes", "base64": base64.b64encode(raw).decode("ascii")}
     return {"__type__": "py_repr", "py_type": type(x).__name__, "repr": repr(x)}
 
 
-def _jsonable_rows(rows: Iterable[tuple[Any, ...]]) -> list[list[Any]]:
-    return [[_jsonable_scalar(v) for v in row] for row in rows]
+# One sqlite3 connection per DB file, reused for every query this (worker) process runs
+# instead of reconnecting each time.
+_conns: dict[str, sqlite3.Connection] = {}
+
+
+def _get_connection(db_path: str, timeout_s: float) -> sqlite3.Connection:
+    conn = _conns.get(db_path)
+    if conn is None:
+        # Opened read-only: SQLite never takes write locks on (or creates) the DB file.
+        uri = Path(db_path).resolve().as_uri() + "?mode=ro"
+        conn = _conns[db_path] = sqlite3.connect(uri, timeout=timeout_s, uri=True)
+        # Gold SQL only reads: refuse writes, keep temp B-trees (sorts, GROUP BY, DISTINCT)
+        # in memory, and give repeated scans of the same DB a 64 MiB page cache plus
+        # mmap'd IO. The journal mode is left alone; switching to WAL would rewrite the DB.
+        conn.execute("PRAGMA query_only=1")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")
+        conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+
+def _json_value(x: Any) -> bytes:
+    # UTF-8 JSON exactly as the output lines have always been written (json.dumps'
+    # default ", " / ": " separators). Row tuples as fetched can be passed directly: they
+    # are written as arrays, and anything non-native (BLOBs) goes to _jsonable_scalar.
+    return json.dumps(x, ensure_ascii=False, default=_jsonable_scalar).encode("utf-8")
+
+
+def _record_prefix(db_id: str, question_id: str, question: str, hint: str) -> bytes:
+    # An output line up to its answer; the line is finished with <answer JSON> + b"}\n".
+    return (
+        b'{"db": ' + _json_value(db_id)
+        + b', "question_id": ' + _json_value(question_id)
+        + b', "question": ' + _json_value(question)
+        + b', "hint": ' + _json_value(hint)
+        + b', "answer": '
+    )
 
 
-def execute_sqlite(db_path: str, sql: str, timeout_s: float) -> ExecOutcome:
+def _run_query(db_path: str, sql: str, timeout_s: float) -> list[tuple[Any, ...]]:
+    conn = _get_connection(db_path, timeout_s)
+    cur = conn.cursor()
+    # A large result is millions of freshly allocated row tuples, none of them cyclic;
+    # keep the cyclic GC from repeatedly rescanning them.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
     try:
-        conn = sqlite3.connect(db_path, timeout=timeout_s, uri=True)
-        cur = conn.cursor()
+        cur.execute(sql)
+        return cur.fetchall()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
         try:
-            cur.execute(sql)
-            rows = cur.fetchall()
-            return ExecOutcome(ok=True, result=_jsonable_rows(rows))
+            cur.close()
         finally:
-            try:
-                cur.close()
-            finally:
-                conn.close()
+            # Nothing is ever committed: drop any implicit transaction (as closing
+            # the connection would) so the DB is not left locked.
+            if conn.in_transaction:
+                conn.rollback()
+
+
+def _execute_job(job: tuple[str, str, float]) -> tuple[bool, bytes | str]:
+    # Runs in a worker process: the answer comes back already encoded as JSON (or the
+    # error message when not ok), so encoding stays off the main process and only one
+    # bytes object is pickled per query. The fetched tuples are encoded as they are; no
+    # converted copy of the rows is built.
+    db_path, sql, timeout_s = job
+    try:
+        rows = _run_query(db_path, sql, timeout_s)
     except Exception as e:
-        return ExecOutcome(ok=False, error=f"{type(e).__name__}: {e}")
+        return False, f"{type(e).__name__}: {e}"
+    return True, _json_value(rows)
+
+
+def _default_cache_path() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "swan", "gold_cache.sqlite")
+
+
+# Gold SQL whose answer depends on when (or how often) it runs: the current date/time or
+# random values. Its results are never stored in the result cache.
+_VOLATILE_SQL_RE = re.compile(
+    r"\bnow\b|\bdatetime\b|\bcurrent_(?:date|time|timestamp)\b|\blocaltime\b|\brandom(?:blob)?\b",
+    flags=re.IGNORECASE,
+)
+
+
+def _open_result_cache(path: str) -> sqlite3.Connection:
+    # Encoded answers of successful queries, persisted across runs; see
+    # _result_cache_key for invalidation.
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE IF NOT EXISTS answers(key BLOB PRIMARY KEY, val BLOB NOT NULL)")
+    return conn
+
+
+def _result_cache_key(db_path: str, sql: str) -> bytes:
+    # The DB file's mtime and size are part of the key, so entries for a modified DB are
+    # simply never hit again. The leading tag does the same for entries written in an
+    # older answer encoding.
+    st = os.stat(db_path)
+    h = hashlib.sha1()
+    for part in ("v3", db_path, str(st.st_mtime_ns), str(st.st_size), sql):
+        h.update(part.encode("utf-8", "surrogatepass"))
+        h.update(b"\0")
+    return h.digest()
 
 
 def iter_csv_rows(csv_path: str) -> Iterable[list[str]]:
     # These CSVs include quoted multi-line SQL; csv.reader handles that correctly
-    # when opened with newline="".
-    with open(csv_path, "r", encoding="utf-8", newline="") as f:
+    # when opened with newline="". A 1 MiB buffer keeps the reads few and large.
+    with open(csv_path, "r", encoding="utf-8", newline="", buffering=1 << 20) as f:
         reader = csv.reader(f)
         for row in reader:
             if not row:
@@ -122,6 +209,24 @@ def main() -> int:
         action="store_true",
         help="Parse inputs and report counts without executing SQL.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of worker processes executing gold SQLs concurrently (default: one per CPU).",
+    )
+    parser.add_argument(
+        "--cache",
+        nargs="?",
+        const=_default_cache_path(),
+        default=None,
+        metavar="PATH",
+        help=(
+            "Reuse answers of earlier runs from a result cache (SQLite file at PATH, default: "
+            "$XDG_CACHE_HOME/swan/gold_cache.sqlite). Off by default; gold SQL using the current "
+            "date/time or random values is always executed."
+        ),
+    )
     args = parser.parse_args()
 
     questions_dir = os.path.abspath(args.questions_dir)
@@ -132,6 +237,16 @@ def main() -> int:
     if not csv_paths:
         raise SystemExit(f"No files matched: {os.path.join(questions_dir, args.pattern)}")
 
+    # Each CSV is parsed once; the overlap check, the pre-scan and the write loop below
+    # all reuse its rows.
+    parsed: dict[str, list[list[str]]] = {}
+
+    def csv_rows(path: str) -> list[list[str]]:
+        rows = parsed.get(path)
+        if rows is None:
+            rows = parsed[path] = list(iter_csv_rows(path))
+        return rows
+
     # If *Queries.csv and *_HybridQueries.csv are fully overlapping w.r.t. the gold SQLs
     # we execute (db_id + row[3]), keep only *Queries.csv to avoid duplication.
     by_name = {os.path.basename(p): p for p in csv_paths}
@@ -146,16 +261,25 @@ def main() -> int:
             filtered.append(p)
             continue
 
-        def gold_rows(path: str) -> list[tuple[str, str]]:
-            rows: list[tuple[str, str]] = []
-            for row in iter_csv_rows(path):
-                db_id = row[0].strip() if len(row) > 0 else ""
-                gold_sql = row[3] if len(row) > 3 else ""
-                rows.append((db_id, gold_sql))
-            return rows
-
-        if gold_rows(p) == gold_rows(by_name[counterpart]):
+        def gold_rows_digest(path: str) -> bytes:
+            # Ordered digest of the (db_id, gold_sql) sequence; each field is
+            # length-prefixed so that field boundaries cannot shift between rows.
+            h = hashlib.blake2b(digest_size=16)
+            for row in csv_rows(path):
+                db_id = (row[0].strip() if len(row) > 0 else "").encode("utf-8")
+                gold_sql = (row[3] if len(row) > 3 else "").encode("utf-8")
+                h.update(len(db_id).to_bytes(4, "little"))
+                h.update(db_id)
+                h.update(len(gold_sql).to_bytes(8, "little"))
+                h.update(gold_sql)
+            return h.digest()
+
+        # A byte-identical copy overlaps trivially and is skipped without being parsed.
+        if filecmp.cmp(p, by_name[counterpart], shallow=False):
+            continue
+        if gold_rows_digest(p) == gold_rows_digest(by_name[counterpart]):
             # skip hybrid: fully overlaps on executed gold SQLs
+            del parsed[p]
             continue
         filtered.append(p)
 
@@ -163,9 +287,103 @@ def main() -> int:
 
     os.makedirs(out_dir, exist_ok=True)
 
+    # db_id -> (db_path, exists): the DB file is looked up once per DB, not once per row.
+    db_files: dict[str, tuple[str, bool]] = {}
+
+    def db_file(db_id: str) -> tuple[str, bool]:
+        found = db_files.get(db_id)
+        if found is None:
+            db_path = default_db_path(db_root, db_id)
+            found = db_files[db_id] = (db_path, os.path.isfile(db_path))
+        return found
+
     # Cache gold SQL outputs across all CSVs in this run so we only execute each
     # (db_path, gold_sql) once (e.g., appears in both *Queries and *HybridQueries).
-    gold_cache: dict[tuple[str, str], ExecOutcome] = {}
+    # Values are (True, answer JSON bytes) or (False, error message).
+    gold_cache: dict[tuple[str, str], tuple[bool, bytes | str]] = {}
+
+    # Check every row in order first: the run stops at the first malformed row or (unless
+    # skipped) missing DB file, and SQL of the rows before it is all that gets executed.
+    # pending maps each distinct (db_path, gold_sql) to where it first occurs; stop is the
+    # (csv_path, row_idx, message) of the row the run ends at, if any.
+    pending: dict[tuple[str, str], tuple[str, int, str]] = {}
+    stop: tuple[str, int, str] | None = None
+    for csv_path in csv_paths:
+        for row_idx, row in enumerate(csv_rows(csv_path), start=1):
+            if args.limit and row_idx > args.limit:
+                break
+            db_id = row[0].strip() if len(row) > 0 else ""
+            gold_sql = row[3] if len(row) > 3 else ""
+            if not db_id or not gold_sql:
+                stop = (
+                    csv_path,
+                    row_idx,
+                    f"Malformed row in {os.path.basename(csv_path)} at line {row_idx}: "
+                    "missing db_id and/or gold_sql (expected columns 0 and 3)",
+                )
+                break
+            db_path, exists = db_file(db_id)
+            if not exists:
+                if not (args.skip_missing_db or args.dry_run):
+                    stop = (csv_path, row_idx, f"missing database file: {db_path}")
+                    break
+            elif not args.dry_run:
+                pending.setdefault((db_path, gold_sql), (csv_path, row_idx, db_id))
+        if stop is not None:
+            break
+
+    # Execute every distinct (db_path, gold_sql) up front on a process pool, so both the
+    # queries and the Python-side row conversion/encoding run in parallel. The write loop
+    # below then only reads from gold_cache.
+    if pending:
+        # With --cache, results of earlier runs for an unchanged DB file are reused without
+        # executing. Volatile SQL is neither looked up nor stored.
+        result_cache = None if args.cache is None else _open_result_cache(args.cache)
+        cache_keys: dict[tuple[str, str], bytes] = {}
+        if result_cache is not None:
+            for key in list(pending):
+                if _VOLATILE_SQL_RE.search(key[1]):
+                    continue
+                ck = _result_cache_key(*key)
+                hit = result_cache.execute("SELECT val FROM answers WHERE key = ?", (ck,)).fetchone()
+                if hit is not None:
+                    gold_cache[key] = (True, zlib.decompress(hit[0]))
+                    del pending[key]
+                else:
+                    cache_keys[key] = ck
+
+        if pending:
+            jobs = [(db_path, gold_sql, args.timeout_s) for db_path, gold_sql in pending]
+            max_workers = min(args.jobs if args.jobs > 0 else (os.cpu_count() or 1), len(jobs))
+            with ProcessPoolExecutor(max_workers=max_workers) as ex:
+                # Results arrive in row order. Without --allow-errors the first failure is
+                # where the run stops (it precedes any stop found above); queries not yet
+                # started are cancelled.
+                for key, outcome in zip(pending, ex.map(_execute_job, jobs)):
+                    gold_cache[key] = outcome
+                    if not outcome[0] and not args.allow_errors:
+                        csv_path, row_idx, db_id = pending[key]
+                        stop = (
+                            csv_path,
+                            row_idx,
+                            f"SQL execution failed for {db_id} ({os.path.basename(csv_path)}:{row_idx}): "
+                            f"{outcome[1]}",
+                        )
+                        ex.shutdown(wait=True, cancel_futures=True)
+                        break
+
+        if result_cache is not None:
+            # Only successes are stored; failing SQL is retried on the next run.
+            with result_cache:
+                result_cache.executemany(
+                    "INSERT OR REPLACE INTO answers(key, val) VALUES (?, ?)",
+                    (
+                        (ck, zlib.compress(gold_cache[key][1]))
+                        for key, ck in cache_keys.items()
+                        if gold_cache.get(key, (False,))[0]
+                    ),
+                )
+            result_cache.close()
 
     for csv_path in csv_paths:
         base = os.path.splitext(os.path.basename(csv_path))[0]
@@ -179,11 +397,16 @@ def main() -> int:
         processed = 0
         written = 0
         missing_db = 0
-        with open(out_path, "w", encoding="utf-8", newline="\n") as out:
-            for row_idx, row in enumerate(iter_csv_rows(csv_path), start=1):
+        # Lines are small and many: a 1 MiB buffer turns them into a few large writes.
+        # Binary mode: every piece of a line is already UTF-8 JSON.
+        with open(out_path, "wb", buffering=1 << 20) as out:
+            for row_idx, row in enumerate(csv_rows(csv_path), start=1):
                 if args.limit and row_idx > args.limit:
                     break
                 processed = row_idx
+                if stop is not None and stop[:2] == (csv_path, row_idx):
+                    # Rows before it are written, as when rows were executed one by one.
+                    raise SystemExit(stop[2])
 
                 # Convention in these files:
                 # row[0]=db_id, row[1]=question, row[3]=gold_sql
@@ -192,85 +415,33 @@ def main() -> int:
                 hint = row[2] if len(row) > 2 else ""
                 gold_sql = row[3] if len(row) > 3 else ""
 
-                if not db_id or not gold_sql:
-                    raise SystemExit(
-                        f"Malformed row in {os.path.basename(csv_path)} at line {row_idx}: "
-                        "missing db_id and/or gold_sql (expected columns 0 and 3)"
-                    )
-
-                db_path = default_db_path(db_root, db_id)
+                db_path, exists = db_file(db_id)
 
-                if not os.path.isfile(db_path):
-                    msg = f"missing database file: {db_path}"
-                    if args.skip_missing_db or args.dry_run:
-                        missing_db += 1
-                        print(
-                            f"[missing-db] {db_id} {base}:{row_idx} -> {db_path}",
-                            file=sys.stderr,
-                        )
-                        out.write(
-                            json.dumps(
-                                {
-                                    "db": db_id,
-                                    "question_id": f"{base}:{row_idx}",
-                                    "question": question,
-                                    "hint": hint,
-                                    "answer": {"__error__": msg},
-                                },
-                                ensure_ascii=False,
-                            )
-                            + "\n"
-                        )
-                        written += 1
-                        continue
-                    raise SystemExit(msg)
-
-                if args.dry_run:
+                if not exists:
+                    missing_db += 1
+                    print(
+                        f"[missing-db] {db_id} {base}:{row_idx} -> {db_path}",
+                        file=sys.stderr,
+                    )
                     out.write(
-                        json.dumps(
-                            {
-                                "db": db_id,
-                                "question_id": f"{base}:{row_idx}",
-                                "question": question,
-                                "hint": hint,
-                                "answer": None,
-                            },
-                            ensure_ascii=False,
-                        )
-                        + "\n"
+                        _record_prefix(db_id, f"{base}:{row_idx}", question, hint)
+                        + _json_value({"__error__": f"missing database file: {db_path}"})
+                        + b"}\n"
                     )
                     written += 1
                     continue
 
-                cache_key = (db_path, gold_sql)
-                if cache_key in gold_cache:
-                    outcome = gold_cache[cache_key]
-                else:
-                    outcome = execute_sqlite(db_path=db_path, sql=gold_sql, timeout_s=args.timeout_s)
-                    gold_cache[cache_key] = outcome
-                if not outcome.ok:
-                    if not args.allow_errors:
-                        raise SystemExit(
-                            f"SQL execution failed for {db_id} ({os.path.basename(csv_path)}:{row_idx}): "
-                            f"{outcome.error}"
-                        )
-                    answer: Any = {"__error__": outcome.error}
-                else:
-                    answer = outcome.result
-
-                out.write(
-                    json.dumps(
-                        {
-                            "db": db_id,
-                            "question_id": f"{base}:{row_idx}",
-                            "question": question,
-                            "hint": hint,
-                            "answer": answer,
-                        },
-                        ensure_ascii=False,
-                    )
-                    + "\n"
-                )
+                if args.dry_run:
+                    out.write(_record_prefix(db_id, f"{base}:{row_idx}", question, hint) + b"null}\n")
+                    written += 1
+                    continue
+
+                ok, answer_json = gold_cache[(db_path, gold_sql)]
+                if not ok:
+                    # Only reachable with --allow-errors; otherwise the run stops at the row.
+                    answer_json = _json_value({"__error__": answer_json})
+
+                out.write(_record_prefix(db_id, f"{base}:{row_idx}", question, hint) + answer_json + b"}\n")
                 written += 1
 
         print(f"{os.path.basename(csv_path)}: processed={processed}, wrote={written}, missing_db={missing_db} -> {out_path}")
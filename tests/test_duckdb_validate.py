@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import duckdb_validate  # noqa: E402
+
+
+def _matches(got: list, expected: list) -> bool:
+    return duckdb_validate._answer_matcher(expected)(got)
+
+
+def test_bool_and_int_rows_do_not_pair_up_across_types() -> None:
+    # Sorted by JSON text the rows are [0], [true] vs [1], [false]: no row-wise match.
+    assert not _matches([[True], [0]], [[False], [1]])
+    assert not _matches([[True], [2.5]], [[1.0], [2.5]])
+
+
+def test_equal_numbers_of_different_types_still_match() -> None:
+    assert _matches([[1.0, 1, 1]], [[1, 1.0, True]])
+    assert _matches([[2], [1]], [[1.0], [2.0]])
+    assert _matches([[0.0]], [[-0.0]])
+
+
+def test_nonfinite_does_not_match_null() -> None:
+    nan, inf = float("nan"), float("inf")
+    assert not _matches([[nan]], [[None]])
+    assert not _matches([[None]], [[nan]])
+    assert not _matches([[inf], [1]], [[None], [1]])
+    assert not _matches([[{"x": -inf}]], [[{"x": None}]])
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import sqlite_compare  # noqa: E402
+
+
+def _write_jsonl(path: Path, lines: list[str]) -> str:
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_nonfinite_gold_does_not_match_null(tmp_path: Path) -> None:
+    gold = _write_jsonl(
+        tmp_path / "gold.jsonl",
+        [
+            '{"question_id": "a", "answer": [[Infinity], [1]]}',
+            '{"question_id": "b", "answer": [[NaN]]}',
+            '{"question_id": "c", "answer": [[-Infinity], [null]]}',
+        ],
+    )
+    new = _write_jsonl(
+        tmp_path / "new.jsonl",
+        [
+            '{"question_id": "a", "answer": [[null], [1]]}',
+            '{"question_id": "b", "answer": [[null]]}',
+            '{"question_id": "c", "answer": [[null], [null]]}',
+        ],
+    )
+    stats = sqlite_compare.compare_file("x", gold, new)
+    assert stats.exact == 0
+    assert (stats.matched_items, stats.gold_items) == (2, 5)
+
+
+def test_nonfinite_matches_itself(tmp_path: Path) -> None:
+    lines = ['{"question_id": "a", "answer": [[NaN, Infinity], [-Infinity, 1.5]]}']
+    gold = _write_jsonl(tmp_path / "gold.jsonl", lines)
+    new = _write_jsonl(tmp_path / "new.jsonl", lines)
+    stats = sqlite_compare.compare_file("x", gold, new)
+    assert (stats.matched_items, stats.gold_items) == (2, 2)
+
+
+def test_lone_surrogate_matches_itself(tmp_path: Path) -> None:
+    lines = [r'{"question_id": "a", "answer": [["\ud800x"], [1]]}']
+    gold = _write_jsonl(tmp_path / "gold.jsonl", lines)
+    new = _write_jsonl(tmp_path / "new.jsonl", lines)
+    stats = sqlite_compare.compare_file("x", gold, new)
+    assert stats.exact == 1
+    assert (stats.matched_items, stats.gold_items) == (2, 2)